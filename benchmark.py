@@ -0,0 +1,274 @@
+# Benchmark các đường nóng của engine, so với baseline để bắt hồi quy hiệu năng.
+#
+#   python benchmark.py                         # chạy tất cả, in bảng kết quả
+#   python benchmark.py -k calc -k sigma        # chỉ chạy benchmark có tên chứa "calc" / "sigma"
+#   python benchmark.py --json out.json         # ghi kết quả ra JSON
+#   python benchmark.py --compare               # như trên nhưng bắt buộc phải có benchmark_baseline.json
+#   (có baseline thì luôn so: chậm hơn quá ngưỡng in REGRESSION và exit 1;
+#    benchmark nào ném exception thì không đo, in FAILED và cả lượt chạy exit 1)
+#   python benchmark.py --update-baseline       # ghi kết quả hiện tại làm baseline mới
+#
+# Mỗi benchmark chạy trên một bộ đầu vào (corpus) giống dữ liệu thật:
+#   cold: tiến trình Python mới, thời gian import + lượt chạy corpus đầu tiên (đo trong subprocess)
+#   warm: sau một lượt làm nóng, thời gian mỗi lời gọi (median, p95) qua nhiều lượt
+#   *_uncached: như warm nhưng xoá cache kết quả (returning, biểu thức đã biên dịch) trước mỗi lượt,
+#     để hồi quy của bộ nhận dạng / bộ phân tích / trình biên dịch không bị cache che mất
+#   peak_kib: bộ nhớ cấp phát đỉnh (tracemalloc) trong một lượt corpus
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+THRESHOLD = 1.25        # chậm hơn baseline quá 1.25 lần (median warm) thì coi là hồi quy
+MIN_DELTA_US = 2.0      # bỏ qua chênh lệch tuyệt đối nhỏ hơn mức này (nhiễu đo)
+
+# Corpus: (tên benchmark, module, tên hàm, danh sách (args, kwargs))
+def _corpora():
+    import random
+    rng = random.Random(580)
+    preview_memo = {}
+    return [
+        ("fact", "process_front_end", "fact",
+         [((n,), {}) for n in [12, 12.0, 360, 97, 1001, 65536, 999983, 600851475143, 2**61 - 1, 10**12 + 39,
+                              (2**61 - 1) ** 2]
+                              + [rng.randint(2, 10**9) for _ in range(40)]]),
+        ("sqrt_simplify", "process_front_end", "sqrt_simplify",
+         [((n,), {}) for n in [8, 12, 72, 200, 980, 123456, 10**6, 4 * 999983, 10**12]
+                              + [rng.randint(2, 10**8) for _ in range(40)]]),
+        ("returning", "process_front_end", "returning",
+         [((v, c), {}) for v in [2.0, 0.5, 1 / 3, 2 ** 0.5, -(8 ** 0.5), math.pi / 2, 3 * math.pi,
+                                 1e12, 1e-8, 123.456, 22 / 7, 1e15 + 0.5, 1.602176634e15]
+                       + [rng.uniform(-1000, 1000) for _ in range(20)]
+                       for c in ("S", "D")]),
+        ("preprocess_expression", "process_front_end", "preprocess_expression",
+         [((e,), {}) for e in ["2sin(30)", "3(x+1)", "(x+1)2", "2(x+1)3", "2pi+sqrt(8)", "x^2+2x+1"]]),
+        ("evaluate_expression", "process_front_end", "evaluate_expression",
+         [((e,), {}) for e in ["2+2", "2sin(30)+sqrt(8)/3", "3(4+5)^2", "ln(10)+log(2, 8)", "cos(60)*tan(45)", "1e999",
+                               "log(8)", "nth_root(8,3.0)"]]),
+        ("evaluate_incremental", "process_front_end", "evaluate_incremental",
+         # Bản xem trước khi gõ dần: các biểu thức chung cây con, dùng chung một memo
+         [((e, preview_memo), {}) for e in ["2sin(30)", "2sin(30)+sqrt(8)", "2sin(30)+sqrt(8)/3",
+                                            "2sin(30)+sqrt(8)/3-cos(60)", "2sin(30)+sqrt(8)/4-cos(60)"]]),
+        ("evaluate_expression_symbolic", "process_front_end", "evaluate_expression",
+         [((e,), {"symbolic": True}) for e in ["sqrt(8)", "x+1", "(x+1)^2-x^2"]]),
+        ("calc", "process_front_end", "calc",
+         [(("x^2+2x+1",), {"x": x}) for x in range(10)]
+         + [(("sin(x)+y",), {"x": 30, "y": 2}), (("2+3*4",), {}), (("sqrt(16)+1",), {}), (("1e999",), {})]),
+        ("solve_eq", "process_front_end", "solve_eq",
+         [((e,), {}) for e in ["x+2=5", "x**2-4=0", "2*x**2-3*x-5=0"]]),
+        ("integral", "process_front_end", "integral",
+         [((0, 1, "x**2"), {}), ((0, "pi", "sin(x)"), {}), ((1, 2, "log(x)"), {}),
+          (("-oo", "oo", "exp(-x**2)"), {}), ((0, 1, "sqrt(1-x**2)"), {})]),
+        ("derivative_at", "process_front_end", "derivative_at",
+         [((e, a), {}) for e, a in [("x**2", 3), ("sin(x)*exp(x)", 1), ("ln(x)/x", 2), ("gamma(x)", 2), ("y*x", 1)]]),
+        ("sigma", "process_front_end", "sigma",
+         [((1, 100, "x^2"), {}), ((1, 10**6, "x^3+2*x"), {}), ((1, 10**5, "1/x^2"), {})]),
+        ("cm", "process_front_end", "cm",
+         # Biên phạm vi float (170! / 171!) và biên _EXACT_PRODUCT_LIMIT (5000 / 5001 thừa số)
+         [((1, 10, "x"), {}), ((1, 50, "1+1/x^2"), {}), ((1, 10**5, "1+1/x^2"), {}), ((2, 10**6, "1-1/x^2"), {}),
+          ((1, 170, "x"), {}), ((1, 171, "x"), {}), ((1, 5000, "x"), {}), ((1, 5001, "x"), {}), ((1, 6000, "-x"), {})]),
+        ("solve_2", "polynomial_equation", "solve_2",
+         [((a, b, c, False), {}) for a, b, c in [(1, -3, 2), (1, 2, 1), (1, 0, -4), (2, 5, -3), (1, 1, 1)]]),
+        ("solve_3", "polynomial_equation", "solve_3",
+         [((a, b, c, d, False), {}) for a, b, c, d in [(1, -6, 11, -6), (1, 0, 0, -8), (1, -3, 3, -1), (2, 1, -5, 2)]]),
+        ("solve_4", "polynomial_equation", "solve_4",
+         # Nghiệm kép với hệ số float: (x-1/3)^2(x-2)(x-5), (x-0.1)^2(x-0.3)^2
+         [((a, b, c, d, f, choice), {}) for a, b, c, d, f in
+          [(1, -10, 24, -10, 1), (1, -23 / 3, 133 / 9, -67 / 9, 10 / 9), (1, -0.8, 0.22, -0.024, 0.0009)]
+          for choice in (False, True)]),
+        ("solve_3_batch", "polynomial_equation", "solve_3_batch",
+         # Nghiệm sát nhau / nhỏ: (x-0.99968)(x-1)(x-1.00032), (x-1e-3)(x-2e-3)(x-3e-3), nghiệm kép (x-1)^2(x-2)
+         [(([1, 1, 1, 1], [-3, -6e-3, -4, -6], [2.9999998976, 1.1e-5, 5, 11], [-0.9999998976, -6e-9, -2, -6]), {})]),
+        ("solve_equation_two", "solving_equations", "solve_equation_two",
+         [(tuple(rng.randint(-9, 9) for _ in range(6)), {}) for _ in range(30)]
+         + [((0.5, 1.5, 2.0, 1.0, -1.0, 3.0), {})]),
+        ("solve_equation_three", "solving_equations", "solve_equation_three",
+         [(tuple(rng.randint(-9, 9) for _ in range(12)), {}) for _ in range(30)]),
+    ]
+
+UNCACHED = ("returning", "evaluate_expression", "calc")     # có thêm bản <tên>_uncached
+
+def _load(selected=None):
+    import importlib
+    benches = []
+    for name, module, func, corpus in _corpora():
+        variants = [(name, False)] + ([(name + "_uncached", True)] if name in UNCACHED else [])
+        for variant, fresh in variants:
+            if selected and not any(key in variant for key in selected):
+                continue
+            benches.append((variant, getattr(importlib.import_module(module), func), corpus, fresh))
+    return benches
+
+def _clear_caches():
+    # Cache kết quả của returning() và cache biểu thức đã biên dịch của session hiện tại
+    import process_front_end
+    process_front_end._format_number.cache_clear()
+    process_front_end.clear_expression_cache()
+
+def _run_corpus(func, corpus):
+    # Đầu vào lỗi (MATH ERROR) là giá trị trả về, không phải exception; exception thật
+    # đã bị check_corpus() chặn trước khi đo
+    for args, kwargs in corpus:
+        func(*args, **kwargs)
+
+def check_corpus(func, corpus) -> list:
+    """Chạy mỗi đầu vào một lần, trả về list mô tả các lời gọi ném exception (rỗng nếu ổn)."""
+    failures = []
+    for args, kwargs in corpus:
+        try:
+            func(*args, **kwargs)
+        except Exception as exc:
+            failures.append(f"{args!r} {kwargs!r}: {exc!r}")
+    return failures
+
+def _in_session():
+    # Chạy trong session riêng: biến chỉ nằm trong RAM, không ghi variable.txt
+    from process_front_end import CalculatorSession, using
+    return using(CalculatorSession())
+
+def measure_warm(func, corpus, min_time: float = 0.2, max_rounds: int = 200, fresh: bool = False) -> dict:
+    _run_corpus(func, corpus)               # làm nóng: import lười, cache, bảng prime...
+    per_call = []
+    start = time.perf_counter()
+    rounds = 0
+    while rounds < 3 or (time.perf_counter() - start < min_time and rounds < max_rounds):
+        if fresh:
+            _clear_caches()                 # ngoài phần đo
+        t = time.perf_counter_ns()
+        _run_corpus(func, corpus)
+        per_call.append((time.perf_counter_ns() - t) / 1000 / len(corpus))
+        rounds += 1
+    per_call.sort()
+    return {
+        "warm_us": statistics.median(per_call),
+        "p95_us": per_call[min(len(per_call) - 1, int(0.95 * len(per_call)))],
+        "rounds": rounds,
+        "calls": len(corpus),
+    }
+
+def measure_memory(func, corpus, fresh: bool = False) -> float:
+    if fresh:
+        _clear_caches()
+    tracemalloc.start()
+    try:
+        _run_corpus(func, corpus)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+def _cold_child(name: str):
+    # Chạy trong tiến trình con: import + lượt corpus đầu tiên, in JSON ra stdout
+    t = time.perf_counter()
+    ((_, func, corpus, _),) = [b for b in _load([name]) if b[0] == name]
+    imported = time.perf_counter() - t
+    with _in_session():
+        _run_corpus(func, corpus)
+    print(json.dumps({"import_s": imported, "cold_s": time.perf_counter() - t}))
+
+def measure_cold(name: str) -> dict:
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--cold-child", name],
+                         capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def run(selected=None, cold: bool = True) -> dict:
+    results = {}
+    failures = {}
+    for name, func, corpus, fresh in _load(selected):
+        # Hàm ném exception sẽ "nhanh" một cách giả tạo: không đo, báo lỗi cả lượt chạy
+        with _in_session():
+            failed = check_corpus(func, corpus)
+        if failed:
+            failures[name] = failed
+            continue
+        entry = {}
+        if cold:
+            entry.update(measure_cold(name))
+        with _in_session():
+            entry.update(measure_warm(func, corpus, fresh=fresh))
+            entry["peak_kib"] = measure_memory(func, corpus, fresh=fresh)
+        results[name] = entry
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "results": results,
+        "failures": failures,
+    }
+
+def compare(current: dict, baseline: dict, threshold: float = THRESHOLD) -> list:
+    """Trả về list (tên, baseline_us, hiện tại_us, tỉ lệ) của các benchmark bị hồi quy."""
+    regressions = []
+    for name, entry in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        old, new = base["warm_us"], entry["warm_us"]
+        if new > old * threshold and new - old > MIN_DELTA_US:
+            regressions.append((name, old, new, new / old))
+    return regressions
+
+def _print_table(report: dict, baseline: dict | None):
+    print(f"{'benchmark':32} {'cold ms':>9} {'warm us':>10} {'p95 us':>10} {'peak KiB':>9} {'vs base':>8}")
+    for name, entry in report["results"].items():
+        cold = f"{entry['cold_s'] * 1000:9.1f}" if "cold_s" in entry else f"{'-':>9}"
+        ratio = ""
+        if baseline and name in baseline.get("results", {}):
+            ratio = f"{entry['warm_us'] / baseline['results'][name]['warm_us']:7.2f}x"
+        print(f"{name:32} {cold} {entry['warm_us']:10.2f} {entry['p95_us']:10.2f} {entry['peak_kib']:9.1f} {ratio:>8}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark engine máy tính")
+    parser.add_argument("-k", action="append", dest="selected", help="chỉ chạy benchmark có tên chứa chuỗi này")
+    parser.add_argument("--json", help="ghi kết quả ra file JSON")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="file baseline (mặc định benchmark_baseline.json)")
+    parser.add_argument("--compare", action="store_true", help="bắt buộc có baseline (không có thì exit 1)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--update-baseline", action="store_true", help="ghi kết quả làm baseline mới")
+    parser.add_argument("--no-cold", action="store_true", help="bỏ đo khởi động lạnh (nhanh hơn)")
+    parser.add_argument("--cold-child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.cold_child:
+        _cold_child(args.cold_child)
+        return 0
+
+    report = run(args.selected, cold=not args.no_cold)
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    _print_table(report, baseline)
+    for name, failed in report["failures"].items():
+        for line in failed:
+            print(f"FAILED {name}: {line}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if report["failures"]:
+        return 1
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        return 0
+    if baseline is None:
+        if args.compare:
+            print(f"Không có baseline: {args.baseline}")
+            return 1
+        return 0
+    regressions = compare(report, baseline, args.threshold)
+    for name, old, new, ratio in regressions:
+        print(f"REGRESSION {name}: {old:.2f} us -> {new:.2f} us ({ratio:.2f}x)")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
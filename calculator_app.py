@@ -1,18 +1,46 @@
+import os
 import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Đo thời gian import từng phần để biết khởi động tốn ở đâu
+_STARTUP = time.perf_counter()
+IMPORT_TIMES = {}
+STARTUP_BUDGET = 1.0    # giây, từ lúc chạy tới khi giao diện hiện lên
+DEBUG_OVERLAY = os.environ.get("CALC_DEBUG") == "1"     # hiện số liệu engine_stats trên màn hình
+PREVIEW_DELAY = 0.15    # giây: ngừng gõ bấy lâu thì mới tính xem trước
+PREVIEW_CACHE_SIZE = 128
 
 # Thư viện chính
+_t = time.perf_counter()
 from process_front_end import *
+import engine_stats
+from expression_parser import ParseError, names, parse, tokenize
+IMPORT_TIMES["process_front_end"] = time.perf_counter() - _t
+
+_t = time.perf_counter()
 import kivy
 from kivy.app import App
+from kivy.clock import Clock
+from kivy.logger import Logger
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
+IMPORT_TIMES["kivy"] = time.perf_counter() - _t
+del _t
 
 #print("Python version:", sys.version)
 #print("Kivy version:", kivy.__version__)
 
+def startup_report(ready_at: float) -> str:
+    lines = [f"{name}: {seconds * 1000:.1f} ms" for name, seconds in IMPORT_TIMES.items()]
+    lines.append(f"ready: {(ready_at - _STARTUP) * 1000:.1f} ms")
+    return ", ".join(lines)
+
 # On/off/other fucntion
 def on():
     pass
@@ -23,17 +51,229 @@ def shift():
 def alpha():
     pass
 
-# Kiểm tra thử có chạy layout + button không
+# Bàn phím: (nhãn trên phím, chuỗi chèn vào biểu thức hoặc tên lệnh)
+KEYPAD = [
+    [("DEG", "mode"), ("(", "("), (")", ")"), ("DEL", "del"), ("AC", "clear")],
+    [("sin", "sin("), ("cos", "cos("), ("tan", "tan("), ("√", "sqrt("), ("^", "^")],
+    [("ln", "ln("), ("log", "log("), ("π", "pi"), ("e", "e"), ("x", "x")],
+    [("7", "7"), ("8", "8"), ("9", "9"), ("÷", "/"), ("×", "*")],
+    [("4", "4"), ("5", "5"), ("6", "6"), ("+", "+"), ("-", "-")],
+    [("1", "1"), ("2", "2"), ("3", "3"), (".", "."), (",", ",")],
+    [("0", "0"), ("y", "y"), ("M", "M"), ("OFF", "off"), ("=", "equals")],
+]
+ANGLE_MODES = ("DEG", "RAD", "GRA")
+
+class ExpressionBuffer:
+    """Biểu thức đang gõ, lưu theo từng phím để DEL xoá cả "sin(" như máy Casio."""
+    def __init__(self):
+        self._pieces = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self._pieces)
+
+    def insert(self, piece: str):
+        self._pieces.append(piece)
+
+    def backspace(self):
+        if self._pieces:
+            self._pieces.pop()
+
+    def clear(self):
+        self._pieces.clear()
+
+    def tokens(self):
+        """Tuple token của biểu thức (bỏ khoảng trắng); None nếu chưa tách được."""
+        try:
+            return tuple(tokenize(self.text))
+        except ParseError:
+            return None
+
+def evaluate_text(text: str, memo=None):
+    """
+    Tính biểu thức và định dạng kết quả để hiển thị. Chạy ở luồng nền.
+    memo: nếu có thì biểu thức thuần số dùng lại giá trị các biểu thức con đã tính.
+    """
+    try:
+        # Có biến (x, y, A..M) thì calc() lấy giá trị đã STO, không thì tính số trực tiếp
+        variables, _ = names(parse(text))
+        if variables - {"pi", "e"}:
+            result = calc(text)
+        elif memo is not None:
+            result = evaluate_incremental(text, memo)
+        else:
+            result = evaluate_expression(text)
+    except Exception:
+        return MATH_ERROR
+    if isinstance(result, float):
+        return returning(result)
+    return result
+
+class Evaluator:
+    """
+    Tính biểu thức ở một luồng nền riêng; kết quả được gửi về luồng giao diện qua Clock.
+    Chỉ kết quả của lần submit mới nhất được giao, việc cũ còn trong hàng đợi bị bỏ qua.
+    memo: giá trị biểu thức con dùng lại giữa các lần submit, chỉ luồng nền đụng tới.
+    """
+    def __init__(self, name: str, memo=None):
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._memo = memo
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def submit(self, text: str, callback):
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+
+        def job():
+            if generation != self._generation:
+                return
+            result = evaluate_text(text, self._memo)
+
+            def deliver(dt):
+                if generation == self._generation:
+                    callback(text, result)
+            Clock.schedule_once(deliver)
+        self._pool.submit(job)
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+
+    def shutdown(self):
+        self.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
 class TestApp(App):
     def build(self):
-        layout = GridLayout(cols=3)
-        layout.add_widget(Button(text="1"))
-        layout.add_widget(Button(text="2"))
-        layout.add_widget(Button(text="3"))
-        layout.add_widget(Button(text="+"))
-        layout.add_widget(Button(text="-"))
-        layout.add_widget(Button(text="="))
-        return layout
+        self.buffer = ExpressionBuffer()
+        # Hai luồng riêng: xem trước không bao giờ bắt phím "=" phải chờ
+        self.evaluator = Evaluator("calc-eval")
+        # Xem trước nhớ cả giá trị từng biểu thức con: sửa một token chỉ tính lại phần bị đổi
+        self.previewer = Evaluator("calc-preview", memo={})
+        self.preview_cache = OrderedDict()     # (token, angle mode) -> kết quả đã tính
+        self._last_tokens = None
+        self._preview_trigger = Clock.create_trigger(self.update_preview, PREVIEW_DELAY)
+
+        root = BoxLayout(orientation="vertical")
+        if DEBUG_OVERLAY:
+            # Overlay debug: thời gian / nhánh code / cache của engine, cập nhật mỗi giây
+            engine_stats.enable()
+            self.overlay = Label(text="", size_hint_y=0.3, font_size="11sp", halign="left", valign="top")
+            self.overlay.bind(size=self.overlay.setter("text_size"))
+            root.add_widget(self.overlay)
+            Clock.schedule_interval(self.update_overlay, 1.0)
+
+        display = BoxLayout(orientation="vertical", size_hint_y=0.3)
+        self.expression_label = Label(text="", font_size="22sp", halign="left", valign="middle")
+        self.preview_label = Label(text="", font_size="16sp", color=(0.6, 0.6, 0.6, 1),
+                                   halign="right", valign="middle")
+        self.result_label = Label(text="", font_size="26sp", halign="right", valign="middle")
+        for label in (self.expression_label, self.preview_label, self.result_label):
+            label.bind(size=label.setter("text_size"))
+            display.add_widget(label)
+        root.add_widget(display)
+
+        keypad = GridLayout(cols=len(KEYPAD[0]))
+        for row in KEYPAD:
+            for text, action in row:
+                button = Button(text=text)
+                button.bind(on_release=lambda _, action=action: self.press(action))
+                if action == "mode":
+                    self.mode_button = button
+                    button.text = current_session().angle_mode
+                keypad.add_widget(button)
+        root.add_widget(keypad)
+        return root
+
+    # Phím bấm: chỉ sửa buffer / nhãn trên luồng giao diện, mọi phép tính đều ở luồng nền
+    def press(self, action: str):
+        if action == "equals":
+            self.evaluate()
+            return
+        if action == "off":
+            self.stop()
+            return
+        if action == "mode":
+            mode = ANGLE_MODES[(ANGLE_MODES.index(current_session().angle_mode) + 1) % len(ANGLE_MODES)]
+            set_angle_mode(mode)
+            self.mode_button.text = mode
+            self._last_tokens = None
+        elif action == "del":
+            self.buffer.backspace()
+        elif action == "clear":
+            self.buffer.clear()
+            self.result_label.text = ""
+        else:
+            self.buffer.insert(action)
+        self.expression_label.text = self.buffer.text
+        self._preview_trigger()
+
+    def evaluate(self):
+        text = self.buffer.text
+        if not text:
+            return
+        self.previewer.cancel()
+        self.result_label.text = "..."
+        self.evaluator.submit(text, self.on_result)
+
+    def on_result(self, text: str, result):
+        self.result_label.text = str(result)
+        self.preview_label.text = ""
+        # "=" có thể đã STO biến: kết quả xem trước cũ không còn đúng
+        self.preview_cache.clear()
+        self._last_tokens = None
+
+    # Xem trước: chỉ tính lại khi dãy token thực sự đổi và biểu thức đã phân tích được
+    def update_preview(self, dt):
+        tokens = self.buffer.tokens()
+        if tokens is None or tokens == self._last_tokens:
+            return
+        self._last_tokens = tokens
+        if not tokens:
+            self.previewer.cancel()
+            self.preview_label.text = ""
+            return
+        try:
+            parse(self.buffer.text)
+        except ParseError:
+            # Đang gõ dở (thiếu ngoặc, toán tử ở cuối...): giữ bản xem trước cũ, không gọi sympy
+            return
+        key = (tokens, current_session().angle_mode)
+        if key in self.preview_cache:
+            self.preview_cache.move_to_end(key)
+            self.previewer.cancel()
+            self.preview_label.text = self.preview_cache[key]
+            return
+        self.previewer.submit(self.buffer.text, lambda text, result: self.on_preview(key, result))
+
+    def on_preview(self, key, result):
+        text = "" if result == MATH_ERROR else f"= {result}"
+        self.preview_cache[key] = text
+        if len(self.preview_cache) > PREVIEW_CACHE_SIZE:
+            self.preview_cache.popitem(last=False)
+        self.preview_label.text = text
+
+    def update_overlay(self, dt):
+        self.overlay.text = engine_stats.summary() or "engine_stats: no calls yet"
+
+    def on_start(self):
+        # Giao diện đã lên: báo thời gian khởi động, rồi mới làm nóng sympy ở luồng nền
+        ready_at = time.perf_counter()
+        Logger.info(f"Startup: {startup_report(ready_at)}")
+        if ready_at - _STARTUP > STARTUP_BUDGET:
+            Logger.warning(f"Startup: over budget ({STARTUP_BUDGET:.1f} s)")
+        start_warmup(lambda timings: Clock.schedule_once(lambda dt: self.on_warmup(timings)))
+
+    def on_warmup(self, timings: dict):
+        report = ", ".join(f"{name}: {seconds * 1000:.1f} ms" for name, seconds in timings.items())
+        Logger.info(f"Warmup: {report}")
+
+    def on_stop(self):
+        self.evaluator.shutdown()
+        self.previewer.shutdown()
+        flush_variables()
 
 if __name__ == "__main__":
-    TestApp().run()
\ No newline at end of file
+    TestApp().run()
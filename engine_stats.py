@@ -0,0 +1,162 @@
+# Đo đạc các đường nóng của engine: số lần gọi, thời gian (tổng, phân vị),
+# nhánh code đã đi (native / sympy / eval fallback ...) và tỉ lệ trúng cache.
+# Mặc định tắt; khi tắt các hàm gốc được gọi thẳng, không qua lớp đo: enable() / disable()
+# tráo hàm gốc và hàm có đo ở mọi module đang giữ tên đó (kể cả bản chép bởi "from ... import *").
+#
+#   import engine_stats
+#   engine_stats.enable()
+#   ... tính toán ...
+#   engine_stats.get_stats()     # dict: functions / caches
+#   engine_stats.reset_stats()
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+SAMPLE_SIZE = 1024      # giữ tối đa bấy nhiêu mẫu thời gian gần nhất mỗi hàm để tính phân vị
+
+_ENABLED = os.environ.get("CALC_STATS") == "1"
+_LOCK = threading.Lock()
+_FUNCTIONS = {}         # tên -> _FunctionStats
+_CACHE_PROVIDERS = {}   # tên -> (hàm trả về dict có hits / misses, hàm đặt lại bộ đếm hoặc None)
+_ACTIVE = threading.local()     # .labels: các hàm timed đang chạy trên luồng này (bỏ qua lời gọi đệ quy)
+_TIMED = []             # (tên hàm, hàm gốc, hàm có đo) của mọi hàm @timed()
+
+class _FunctionStats:
+    __slots__ = ("calls", "errors", "total_ns", "samples", "paths")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+        self.paths = {}
+
+def _swap(instrumented: bool):
+    import sys
+    for attr, raw, wrapper in list(_TIMED):
+        old, new = (raw, wrapper) if instrumented else (wrapper, raw)
+        for module in list(sys.modules.values()):
+            namespace = getattr(module, "__dict__", None)
+            if namespace is not None and namespace.get(attr) is old:
+                setattr(module, attr, new)
+
+def enable():
+    global _ENABLED
+    if not _ENABLED:
+        _ENABLED = True
+        _swap(True)
+
+def disable():
+    global _ENABLED
+    if _ENABLED:
+        _ENABLED = False
+        _swap(False)
+
+def is_enabled() -> bool:
+    return _ENABLED
+
+def _entry(name: str) -> _FunctionStats:
+    stats = _FUNCTIONS.get(name)
+    if stats is None:
+        stats = _FUNCTIONS.setdefault(name, _FunctionStats())
+    return stats
+
+def timed(name: str | None = None):
+    """
+    Decorator đo số lần gọi / thời gian của hàm (chỉ khi đang bật).
+    Trả về chính hàm gốc khi đang tắt; enable() mới thay tên hàm trong module bằng bản có đo.
+    """
+    def decorate(func):
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _ENABLED:
+                return func(*args, **kwargs)
+            active = getattr(_ACTIVE, "labels", None)
+            if active is None:
+                active = _ACTIVE.labels = set()
+            if label in active:
+                # Gọi lại chính nó (vd solve_equation_two đổi sang Fraction rồi gọi lại): chỉ tính lời gọi ngoài
+                return func(*args, **kwargs)
+            active.add(label)
+            start = time.perf_counter_ns()
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                active.discard(label)
+                with _LOCK:
+                    stats = _entry(label)
+                    stats.calls += 1
+                    stats.errors += failed
+                    stats.total_ns += elapsed
+                    stats.samples.append(elapsed)
+        _TIMED.append((func.__name__, func, wrapper))
+        return wrapper if _ENABLED else func
+    return decorate
+
+def record_path(name: str, path: str):
+    """Ghi nhận hàm `name` đã đi nhánh `path` (vd "native", "sympy", "eval")."""
+    if not _ENABLED:
+        return
+    with _LOCK:
+        paths = _entry(name).paths
+        paths[path] = paths.get(path, 0) + 1
+
+def register_cache(name: str, info, reset=None):
+    """Đăng ký một cache; info() trả về dict có ít nhất hits và misses, reset() (nếu có) đặt lại bộ đếm."""
+    _CACHE_PROVIDERS[name] = (info, reset)
+
+def _percentile(ordered: list, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def get_stats() -> dict:
+    with _LOCK:
+        functions = {}
+        for name, stats in _FUNCTIONS.items():
+            ordered = sorted(stats.samples)
+            functions[name] = {
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "total_ms": stats.total_ns / 1e6,
+                "mean_us": stats.total_ns / stats.calls / 1e3 if stats.calls else 0.0,
+                "p50_us": _percentile(ordered, 0.50) / 1e3,
+                "p95_us": _percentile(ordered, 0.95) / 1e3,
+                "p99_us": _percentile(ordered, 0.99) / 1e3,
+                "paths": dict(stats.paths),
+            }
+    caches = {}
+    for name, (info, _) in list(_CACHE_PROVIDERS.items()):
+        data = dict(info())
+        lookups = data.get("hits", 0) + data.get("misses", 0)
+        data["hit_rate"] = data.get("hits", 0) / lookups if lookups else 0.0
+        caches[name] = data
+    return {"enabled": _ENABLED, "functions": functions, "caches": caches}
+
+def reset_stats():
+    with _LOCK:
+        _FUNCTIONS.clear()
+    for _, reset in list(_CACHE_PROVIDERS.values()):
+        if reset is not None:
+            reset()
+
+def summary(limit: int = 8) -> str:
+    """Vài dòng tóm tắt (hàm tốn thời gian nhất + cache) cho overlay / log."""
+    stats = get_stats()
+    rows = sorted(stats["functions"].items(), key=lambda item: -item[1]["total_ms"])[:limit]
+    lines = []
+    for name, s in rows:
+        paths = " ".join(f"{path}={count}" for path, count in s["paths"].items())
+        lines.append(f"{name.rsplit('.', 1)[-1]}: {s['calls']}x p50 {s['p50_us']:.0f}us "
+                     f"p95 {s['p95_us']:.0f}us {paths}".rstrip())
+    for name, c in stats["caches"].items():
+        lines.append(f"cache {name}: {c['hit_rate'] * 100:.0f}% ({c.get('hits', 0)}/{c.get('hits', 0) + c.get('misses', 0)})")
+    return "\n".join(lines)
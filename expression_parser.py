@@ -0,0 +1,270 @@
+# Bộ phân tích biểu thức riêng cho máy tính (không cần sympy).
+# Cú pháp: số (2, 1.5, .5, 1e-3), tên (biến / hằng / hàm), + - * / ^ ** ( ) ,
+# nhân ngầm (2x, 2(x+1), (x+1)(x-1), 2pi, 2sin(30)), dấu âm một ngôi.
+# Biểu thức được phân tích kiểu Pratt thành cây nhỏ (tuple), rồi sinh ra code Python
+# và biên dịch một lần thành hàm, gọi lại chỉ tốn vài micro giây.
+import inspect
+import keyword
+import math
+import operator
+import re
+
+class ParseError(ValueError):
+    pass
+
+_TOKEN_RE = re.compile(r"""
+    (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+  | (?P<op>\*\*|[-+*/^(),])
+  | (?P<space>\s+)
+""", re.VERBOSE)
+
+# Độ ưu tiên (binding power) của toán tử hai ngôi
+_INFIX = {"+": 10, "-": 10, "*": 20, "/": 20, "^": 40, "**": 40}
+_PREFIX_BP = 30         # -x^2 = -(x^2), 2^-1 vẫn hợp lệ
+
+def tokenize(text: str) -> list:
+    """Tách chuỗi thành list (loại, giá trị); loại là "number", "name" hoặc "op"."""
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if m is None:
+            raise ParseError(f"Unexpected character {text[pos]!r} at {pos}")
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "space":
+            continue
+        value = m.group()
+        if kind == "number":
+            value = float(value) if any(ch in value for ch in ".eE") else int(value)
+        elif kind == "op" and value == "**":
+            value = "^"
+        tokens.append((kind, value))
+    return tokens
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def next(self):
+        tok = self.peek()
+        if tok[0] is None:
+            raise ParseError("Unexpected end of expression")
+        self.pos += 1
+        return tok
+
+    def expect(self, value):
+        tok = self.next()
+        if tok != ("op", value):
+            raise ParseError(f"Expected {value!r}, got {tok[1]!r}")
+
+    def expression(self, min_bp: int = 0):
+        left = self.prefix()
+        while True:
+            kind, value = self.peek()
+            if kind == "op" and value in _INFIX:
+                op = value
+            elif kind in ("number", "name") or (kind, value) == ("op", "("):
+                # "2 3" không phải 2*3: hai số liền nhau là lỗi cú pháp như bản sympy
+                if kind == "number" and self.tokens[self.pos - 1][0] == "number":
+                    raise ParseError(f"Unexpected number {value!r}")
+                op = None           # nhân ngầm, cùng mức với *
+            else:
+                break
+            bp = _INFIX[op or "*"]
+            if bp <= min_bp:
+                break
+            if op is not None:
+                self.next()
+            # ^ kết hợp phải: 2^3^2 = 2^(3^2)
+            right = self.expression(bp - 1 if op == "^" else bp)
+            left = ("bin", op or "*", left, right)
+        return left
+
+    def prefix(self):
+        kind, value = self.next()
+        if kind == "number":
+            return ("num", value)
+        if kind == "name":
+            if self.peek() == ("op", "("):
+                self.next()
+                args = []
+                if self.peek() != ("op", ")"):
+                    args.append(self.expression())
+                    while self.peek() == ("op", ","):
+                        self.next()
+                        args.append(self.expression())
+                self.expect(")")
+                return ("call", value, tuple(args))
+            return ("name", value)
+        if (kind, value) == ("op", "("):
+            node = self.expression()
+            self.expect(")")
+            return node
+        if (kind, value) == ("op", "-"):
+            return ("neg", self.expression(_PREFIX_BP))
+        if (kind, value) == ("op", "+"):
+            return self.expression(_PREFIX_BP)
+        raise ParseError(f"Unexpected token {value!r}")
+
+def parse(text: str):
+    """Phân tích biểu thức thành cây: ("num", v), ("name", n), ("neg", a), ("bin", op, a, b), ("call", f, args)."""
+    parser = _Parser(tokenize(text))
+    node = parser.expression()
+    if parser.peek()[0] is not None:
+        raise ParseError(f"Unexpected token {parser.peek()[1]!r}")
+    return node
+
+def names(node) -> tuple[set, set]:
+    """Trả về (tên dùng như giá trị, tên dùng như hàm)."""
+    values, functions = set(), set()
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        kind = item[0]
+        if kind == "name":
+            values.add(item[1])
+        elif kind == "neg":
+            stack.append(item[1])
+        elif kind == "bin":
+            stack.extend(item[2:])
+        elif kind == "call":
+            functions.add(item[1])
+            stack.extend(item[2])
+    return values, functions
+
+def _to_source(node) -> str:
+    kind = node[0]
+    if kind == "num":
+        # 1e999 tràn thành inf, repr() ra tên "inf" không tồn tại: giữ nguyên dạng literal
+        return repr(node[1]) if math.isfinite(node[1]) else "1e999"
+    if kind == "name":
+        return node[1]
+    if kind == "neg":
+        return f"(-{_to_source(node[1])})"
+    if kind == "bin":
+        op = "**" if node[1] == "^" else node[1]
+        return f"({_to_source(node[2])} {op} {_to_source(node[3])})"
+    return f"{node[1]}({', '.join(_to_source(arg) for arg in node[2])})"
+
+def _resolve_calls(node, namespace: dict):
+    """x(x+1) với x không phải hàm trong namespace là phép nhân ngầm x*(x+1)."""
+    kind = node[0]
+    if kind == "neg":
+        return ("neg", _resolve_calls(node[1], namespace))
+    if kind == "bin":
+        return ("bin", node[1], _resolve_calls(node[2], namespace), _resolve_calls(node[3], namespace))
+    if kind == "call":
+        args = tuple(_resolve_calls(arg, namespace) for arg in node[2])
+        if not callable(namespace.get(node[1])) and len(args) == 1:
+            return ("bin", "*", ("name", node[1]), args[0])
+        return ("call", node[1], args)
+    return node
+
+def _calls(node):
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if item[0] == "neg":
+            stack.append(item[1])
+        elif item[0] == "bin":
+            stack.extend(item[2:])
+        elif item[0] == "call":
+            yield item
+            stack.extend(item[2])
+
+def _check_call(func, name: str, args: tuple):
+    """
+    Sai số đối số (log(8) với log(cơ số, số)) hoặc số thực ở tham số khai báo int
+    (nth_root(8, 3.0)) là lỗi lúc biên dịch, không phải lỗi tính toán lúc gọi.
+    """
+    try:
+        signature = inspect.signature(func)
+    except (TypeError, ValueError):
+        return
+    try:
+        bound = signature.bind(*args)
+    except TypeError:
+        raise ParseError(f"Wrong number of arguments for {name!r}") from None
+    for param, arg in bound.arguments.items():
+        while arg[0] == "neg":
+            arg = arg[1]
+        if signature.parameters[param].annotation is int and arg[0] == "num" and not isinstance(arg[1], int):
+            raise ParseError(f"Argument {param!r} of {name!r} must be an integer")
+
+def _prepare(expr, namespace: dict, variables=None):
+    """Phân tích và kiểm tra biểu thức; trả về (cây đã gỡ nhân ngầm, tuple tên biến)."""
+    node = _resolve_calls(parse(expr) if isinstance(expr, str) else expr, namespace)
+    value_names, function_names = names(node)
+    for name in function_names:
+        if not callable(namespace.get(name)):
+            raise ParseError(f"Unknown function {name!r}")
+    for _, name, args in _calls(node):
+        _check_call(namespace[name], name, args)
+    for name in value_names:
+        # "sin 30" / "sin*30": hàm dùng như giá trị là lỗi cú pháp, không phải phép nhân
+        if callable(namespace.get(name)):
+            raise ParseError(f"Function {name!r} needs parentheses")
+    params = tuple(sorted(value_names - namespace.keys()))
+    for name in params + tuple(value_names):
+        if keyword.iskeyword(name) or name.startswith("__"):
+            raise ParseError(f"Invalid name {name!r}")
+    if variables is not None and not set(params) <= set(variables):
+        raise ParseError(f"Unknown name(s) {sorted(set(params) - set(variables))}")
+    return node, params
+
+def compile_expression(expr, namespace: dict, variables=None):
+    """
+    Biên dịch biểu thức (chuỗi hoặc cây) thành hàm Python.
+    namespace: các hàm / hằng được phép dùng; tên còn lại là biến, thành tham số của hàm.
+    variables: nếu có thì chỉ cho phép các biến trong đó.
+    Trả về (hàm, tuple tên biến theo thứ tự tham số).
+    """
+    node, params = _prepare(expr, namespace, variables)
+    code = f"lambda {', '.join(params)}: {_to_source(node)}"
+    scope = dict(namespace)
+    scope["__builtins__"] = {}
+    return eval(code, scope), params
+
+_OPERATORS = {"+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv, "^": operator.pow}
+
+def _evaluate(node, namespace: dict, memo: dict):
+    """Trả về (khoá, giá trị) của nút; khoá dựng từ khoá các nút con nên 1 và 1.0 khác nhau."""
+    kind = node[0]
+    if kind == "num":
+        return (kind, repr(node[1])), node[1]
+    if kind == "name":
+        return node, namespace[node[1]]
+    children = (node[1],) if kind == "neg" else node[2:] if kind == "bin" else node[2]
+    keys, values = [], []
+    for child in children:
+        key, value = _evaluate(child, namespace, memo)
+        keys.append(key)
+        values.append(value)
+    key = (kind, None if kind == "neg" else node[1], tuple(keys))
+    try:
+        return key, memo[key]
+    except KeyError:
+        pass
+    if kind == "neg":
+        value = -values[0]
+    elif kind == "bin":
+        value = _OPERATORS[node[1]](*values)
+    else:
+        value = namespace[node[1]](*values)
+    memo[key] = value
+    return key, value
+
+def evaluate(expr, namespace: dict, memo: dict):
+    """
+    Tính biểu thức không có biến bằng cách duyệt cây (không sinh code), nhớ giá trị từng
+    biểu thức con trong memo: sửa một token thì chỉ các nút từ chỗ sửa lên gốc phải tính lại.
+    Cùng kiểm tra và cùng ngữ nghĩa với compile_expression(expr, namespace, ())().
+    """
+    node, _ = _prepare(expr, namespace, ())
+    return _evaluate(node, namespace, memo)[1]
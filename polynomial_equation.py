@@ -1,13 +1,19 @@
 from process_front_end import *
+from process_front_end import _accepts_session
 import cmath
+
+import engine_stats
 # 2-power
 # Phương trình bậc nhất.
   
+@_accepts_session
 def solve_1(a: float, b: float):
         return -b/a
   
 # Phương trình bậc 2
   
+@engine_stats.timed()
+@_accepts_session
 def solve_2(a: int | float, b: int | float, c: int | float, choice: bool):
         if a == 0:
                 return solve_1(b, c)
@@ -28,6 +34,8 @@ def solve_2(a: int | float, b: int | float, c: int | float, choice: bool):
                 elif choice == False:
                         return "No Solution!!!"  
 # 3-power
+@engine_stats.timed()
+@_accepts_session
 def solve_3(a: float, b: float, c: float, d: float, choice: bool):
     if a == 0:
         # Nếu a = 0 thì quay lại bậc 2
@@ -74,9 +82,301 @@ def solve_3(a: float, b: float, c: float, d: float, choice: bool):
         roots = (returning(t1 - b/(3*a)), returning(t2 - b/(3*a)), returning(t3 - b/(3*a)))
 
     return roots
+# Giải hàng loạt (NumPy): chỉ tính số, không định dạng returning().
+# Phân loại nghiệm theo từng dòng:
+REAL_ROOTS = 0          # các nghiệm thực phân biệt
+DOUBLE_ROOT = 1         # có nghiệm thực bội
+COMPLEX_ROOTS = 2       # có cặp nghiệm phức liên hợp
+DEGENERATE = 3          # a == 0, giảm bậc (không còn ẩn thì nghiệm là nan)
+_DOUBLE_ROOT_EPS = 1e-12        # |delta| tương đối dưới mức này coi là nghiệm kép (nhiễu làm tròn ~1e-14)
+
+def _coefficient_arrays(*coeffs):
+        import numpy as np
+        arrays = np.broadcast_arrays(*(np.asarray(c, dtype=float) for c in coeffs))
+        return [np.atleast_1d(arr).ravel() for arr in arrays]
+
+@engine_stats.timed()
+@_accepts_session
+def solve_2_batch(a, b, c):
+        """
+        Giải nhiều phương trình ax^2 + bx + c = 0 cùng lúc.
+        Trả về (roots, kind): roots là mảng complex (N, 2), kind là mảng phân loại (N,).
+        """
+        import numpy as np
+        a, b, c = _coefficient_arrays(a, b, c)
+        n = a.shape[0]
+        roots = np.full((n, 2), np.nan, dtype=complex)
+        kind = np.full(n, DEGENERATE, dtype=np.int8)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+                # a == 0: bậc nhất
+                linear = (a == 0) & (b != 0)
+                roots[linear, 0] = -c[linear] / b[linear]
+
+                quad = a != 0
+                delta = b**2 - 4*a*c
+                s = np.sqrt(np.abs(delta))
+                # Công thức ổn định: tránh trừ hai số gần bằng nhau.
+                # Dùng cùng một dấu (signbit, để b = -0.0 không lệch) cho q và cho việc chọn nghiệm
+                negative = np.signbit(b)
+                q = -0.5 * (b + np.where(negative, -s, s))
+                big, small = q / a, c / q
+                plus = np.where(negative, big, small)    # (-b + sqrt(delta)) / 2a
+                minus = np.where(negative, small, big)   # (-b - sqrt(delta)) / 2a
+
+                real = quad & (delta > 0)
+                roots[real, 0] = plus[real]
+                roots[real, 1] = minus[real]
+                kind[real] = REAL_ROOTS
+
+                double = quad & (delta == 0)
+                roots[double, 0] = roots[double, 1] = -b[double] / (2*a[double])
+                kind[double] = DOUBLE_ROOT
+
+                cmplx = quad & (delta < 0)
+                re = -b[cmplx] / (2*a[cmplx])
+                im = s[cmplx] / (2*a[cmplx])
+                roots[cmplx, 0] = re + 1j*im
+                roots[cmplx, 1] = re - 1j*im
+                kind[cmplx] = COMPLEX_ROOTS
+        return roots, kind
+
+@engine_stats.timed()
+@_accepts_session
+def solve_3_batch(a, b, c, d):
+        """
+        Giải nhiều phương trình ax^3 + bx^2 + cx + d = 0 cùng lúc.
+        Trả về (roots, kind): roots là mảng complex (N, 3) (nghiệm bội được lặp lại),
+        kind là mảng phân loại (N,). Dòng có a == 0 được giải như bậc 2.
+        """
+        import numpy as np
+        a, b, c, d = _coefficient_arrays(a, b, c, d)
+        n = a.shape[0]
+        roots = np.full((n, 3), np.nan, dtype=complex)
+        kind = np.full(n, DEGENERATE, dtype=np.int8)
+
+        low = a == 0
+        if low.any():
+                roots[low, :2] = solve_2_batch(b[low], c[low], d[low])[0]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+                # Chuyển về dạng thu gọn t^3 + pt + q = 0, x = t - b/(3a)
+                B, C, D = b / a, c / a, d / a
+                shift = B / 3
+                p = C - B**2 / 3
+                q = 2*B**3 / 27 - B*C / 3 + D
+                delta = (q/2)**2 + (p/3)**3
+                cubic = ~low
+
+                # Nghiệm kép khi delta ~ 0 so với độ lớn hai số hạng của nó (không dùng ngưỡng
+                # tuyệt đối: nghiệm sát nhau / nhỏ sẽ bị gộp nhầm thành nghiệm kép)
+                scale = np.maximum((q/2)**2, np.abs(p/3)**3)
+                double = cubic & (np.abs(delta) <= _DOUBLE_ROOT_EPS * scale)
+                u = np.cbrt(-q/2)
+                x1, x2 = 2*u - shift, -u - shift
+                roots[double, 0] = x1[double]
+                roots[double, 1] = roots[double, 2] = x2[double]
+                kind[double] = DOUBLE_ROOT
+
+                one_real = cubic & ~double & (delta > 0)
+                s = np.sqrt(np.where(one_real, delta, 0))
+                u, v = np.cbrt(-q/2 + s), np.cbrt(-q/2 - s)
+                re = -(u + v)/2 - shift
+                im = (u - v) * math.sqrt(3) / 2
+                roots[one_real, 0] = (u + v - shift)[one_real]
+                roots[one_real, 1] = (re + 1j*im)[one_real]
+                roots[one_real, 2] = (re - 1j*im)[one_real]
+                kind[one_real] = COMPLEX_ROOTS
+
+                three_real = cubic & ~double & (delta < 0)
+                r = np.sqrt(np.where(three_real, -p/3, 0))
+                phi = np.arccos(np.clip(-q / (2 * np.where(three_real, r**3, 1)), -1, 1))
+                for k in range(3):
+                        t = 2*r*np.cos((phi + 2*k*math.pi)/3)
+                        roots[three_real, k] = (t - shift)[three_real]
+                kind[three_real] = REAL_ROOTS
+        return roots, kind
+# n-power: trị riêng ma trận đồng hành + Aberth-Ehrlich + Newton polishing
+def _horner(coeffs, z):
+        """Tính p(z) và p'(z) cùng lúc, coeffs (N, n+1), z (N, k)."""
+        p = coeffs[:, :1] * 1
+        dp = 0 * z
+        for i in range(1, coeffs.shape[1]):
+                dp = dp * z + p
+                p = p * z + coeffs[:, i:i+1]
+        return p, dp
+
+@engine_stats.timed()
+@_accepts_session
+def solve_n(coeffs, tol: float = 4e-16, max_iter: int = 200):
+        """
+        Tìm mọi nghiệm (phức) của đa thức, hệ số xếp từ bậc cao xuống.
+        coeffs 1 chiều -> mảng nghiệm (n,); coeffs 2 chiều (N, n+1) -> giải N đa thức
+        cùng bậc một lượt, trả về (N, n). Nghiệm được sắp theo phần thực.
+        """
+        import numpy as np
+        coeffs = np.asarray(coeffs)
+        single = coeffs.ndim == 1
+        if single:
+                nonzero = np.flatnonzero(coeffs)
+                coeffs = coeffs[nonzero[0]:] if nonzero.size else coeffs[:1]
+                coeffs = coeffs[None, :]
+        if np.any(coeffs[:, 0] == 0):
+                raise ValueError(MATH_ERROR)
+        real_input = not np.iscomplexobj(coeffs)
+        monic = coeffs.astype(complex) / coeffs[:, :1]
+        n = monic.shape[1] - 1
+        if n == 0:
+                empty = np.empty((monic.shape[0], 0), dtype=complex)
+                return empty[0] if single else empty
+
+        # Điểm xuất phát: trị riêng ma trận đồng hành (LAPACK, cả lô một lượt),
+        # sau đó Aberth-Ehrlich tinh chỉnh đồng thời mọi nghiệm
+        companion = np.zeros((monic.shape[0], n, n), dtype=float if real_input else complex)
+        companion[:, 0, :] = -(monic[:, 1:].real if real_input else monic[:, 1:])
+        companion[:, np.arange(1, n), np.arange(n - 1)] = 1
+        z = np.linalg.eigvals(companion).astype(complex)
+
+        diag = np.arange(n)
+        abs_coeffs = np.abs(monic)
+        eps = np.finfo(float).eps
+        active = np.ones(z.shape, dtype=bool)
+        todo = np.arange(z.shape[0])        # chỉ lặp trên các đa thức chưa hội tụ
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+                for _ in range(max_iter):
+                        zz, cc = z[todo], monic[todo]
+                        p, dp = _horner(cc, zz)
+                        ratio = p / dp
+                        diff = zz[:, :, None] - zz[:, None, :]
+                        diff[:, diag, diag] = np.inf        # bỏ số hạng j == i
+                        s = np.sum(1 / diff, axis=2)
+                        w = ratio / (1 - ratio * s)
+                        w = np.where(np.isfinite(w) & active[todo], w, 0)
+                        # Dừng khi |p(z)| đã chạm sai số làm tròn hoặc bước gần như bằng 0
+                        rounding = 8 * eps * _horner(abs_coeffs[todo], np.abs(zz))[0].real
+                        still = (np.abs(w) > tol * np.abs(zz)) & (np.abs(p) > rounding)
+                        zz = zz - w
+                        z[todo] = zz
+                        active[todo] = still
+                        todo = todo[still.any(axis=1)]
+                        if todo.size == 0:
+                                break
+
+                # Newton polishing, chỉ nhận bước làm |p| nhỏ đi
+                for _ in range(2):
+                        p, dp = _horner(monic, z)
+                        step = np.where(dp != 0, p / dp, 0)
+                        candidate = z - step
+                        better = np.abs(_horner(monic, candidate)[0]) < np.abs(p)
+                        z = np.where(better, candidate, z)
+
+        if real_input:
+                tiny = np.abs(z.imag) <= 1e-12 * (1 + np.abs(z.real))
+                z = np.where(tiny, z.real + 0j, z)
+        z = np.take_along_axis(z, np.lexsort((z.imag, z.real), axis=-1), axis=-1)
+        return z[0] if single else z
+
+# Tách phần không bình phương (Yun) trên hệ số hữu tỉ để nghiệm bội không bị mất chính xác
+def _poly_trim(p):
+        i = 0
+        while i < len(p) - 1 and p[i] == 0:
+                i += 1
+        return p[i:]
+
+def _poly_deriv(p):
+        n = len(p) - 1
+        return _poly_trim([c * (n - i) for i, c in enumerate(p[:-1])] or [0])
+
+def _poly_divmod(num, den):
+        num = list(num)
+        q = []
+        while len(num) >= len(den):
+                k = num[0] / den[0]
+                q.append(k)
+                for i in range(len(den)):
+                        num[i] -= k * den[i]
+                num.pop(0)
+        return q or [0], _poly_trim(num or [0])
+
+def _poly_sub(p, q):
+        width = max(len(p), len(q))
+        p = [0] * (width - len(p)) + list(p)
+        q = [0] * (width - len(q)) + list(q)
+        return _poly_trim([x - y for x, y in zip(p, q)])
+
+def _poly_gcd(a, b):
+        while b != [0]:
+                a, b = b, _poly_divmod(a, b)[1]
+        return [c / a[0] for c in a]
+
+def _squarefree(p):
+        """Trả về list (thừa số không bình phương, bội) với p = hằng số * tích thừa số^bội."""
+        parts = []
+        g = _poly_gcd(p, _poly_deriv(p))
+        b = _poly_divmod(p, g)[0]
+        d = _poly_sub(_poly_divmod(_poly_deriv(p), g)[0], _poly_deriv(b))
+        k = 1
+        while len(b) > 1:
+                a = _poly_gcd(b, d)
+                if len(a) > 1:
+                        parts.append((a, k))
+                b = _poly_divmod(b, a)[0]
+                d = _poly_sub(_poly_divmod(d, a)[0], _poly_deriv(b))
+                k += 1
+        return parts
+
 # 4-power
-def solve_4(a: int | float, b: int | float, c: int | float, d: int | float, f: int | float):
-        pass
+# Hệ số float không tách được nghiệm kép chính xác (_squarefree): numpy trả nghiệm kép thành
+# cặp gần liên hợp với phần ảo cỡ sqrt(eps) ~ 1e-8, coi là hai nghiệm thực bằng nhau
+_REAL_ROOT_TOL = 1e-7
+
+def _merge_double_roots(coeffs):
+        """
+        Nghiệm của solve_n(); cặp gần liên hợp (phần ảo <= _REAL_ROOT_TOL) là một nghiệm thực
+        kép: gộp thành một nghiệm, chỉnh lại bằng Newton trên p' (nghiệm kép của p là nghiệm đơn của p').
+        """
+        import numpy as np
+        found = sorted((complex(r) for r in solve_n(coeffs)), key=lambda r: (r.real, r.imag))
+        deriv = np.polyder(coeffs)
+        roots = []
+        i = 0
+        while i < len(found):
+                r = found[i]
+                near_real = 0 < abs(r.imag) <= _REAL_ROOT_TOL * (1 + abs(r.real))
+                if near_real and i + 1 < len(found) and abs(found[i + 1] - r.conjugate()) <= 2 * abs(r.imag):
+                        x = (r.real + found[i + 1].real) / 2
+                        for _ in range(3):
+                                slope = np.polyval(np.polyder(deriv), x)
+                                if slope == 0:
+                                        break
+                                x -= np.polyval(deriv, x) / slope
+                        roots.append(complex(float(x)))
+                        i += 2
+                else:
+                        roots.append(r)
+                        i += 1
+        return roots
+
+@engine_stats.timed()
+@_accepts_session
+def solve_4(a: int | float, b: int | float, c: int | float, d: int | float, f: int | float, choice: bool):
+        if a == 0:
+                # Nếu a = 0 thì quay lại bậc 3
+                return solve_3(b, c, d, f, choice)
+        from fractions import Fraction
+        roots = []
+        for factor, _ in _squarefree([Fraction(v) for v in (a, b, c, d, f)]):
+                if len(factor) == 2:
+                        roots.append(complex(-factor[1] / factor[0]))
+                else:
+                        roots.extend(_merge_double_roots([float(v) for v in factor]))
+        roots.sort(key=lambda r: (r.real, r.imag))
+        is_real = [abs(r.imag) <= 1e-9 * (1 + abs(r.real)) for r in roots]
+        if choice == True:
+                return tuple(returning(r.real) if real else r for r, real in zip(roots, is_real))
+        if not any(is_real):
+                return "No Solution!!!"
+        return tuple(returning(r.real) for r, real in zip(roots, is_real) if real)
 if __name__ == "__main__":
                 print("#=#=#=# Polynomial Equation tester #=#=#=#")
                 first_choice = int(input("Input degree?\nSelect 2 to 4\n").strip())
@@ -108,15 +408,17 @@ if __name__ == "__main__":
                         if isinstance(result, str): print(result)
                         else: print(*result[:3])
                 elif first_choice == 4:
-                        #a, b, c, d, f = map(int, input("a b c").split())
-                        #cmplx = int(input("Complex Result?\n1: On\n0: Off"))
-                        #try:
-                        #        if cmplx == 1:
-                        #                cmplx = True
-                        #        else:
-                        #                cmplx = False
-                        #except: cmplx = False
-                        #print("Result: ", *solve(a, b, c, cmplx))
-                        print("In progess...")
+                        a, b, c, d, f = map(int, input("a b c d e\n").split())
+                        cmplx = int(input("Complex Result?\n1: On\n0: Off\n"))
+                        try:
+                                if cmplx == 1:
+                                        cmplx = True
+                                else:
+                                        cmplx = False
+                        except: cmplx = False
+                        result = solve_4(a, b, c, d, f, cmplx)
+                        print("Result: ", end=" ")
+                        if isinstance(result, str): print(result)
+                        else: print(*result[:4])
         #except:
                 #print("E@$#R!!!")
\ No newline at end of file
@@ -1,12 +1,50 @@
-from decimal import Decimal, getcontext
-getcontext().prec = 12  # độ chính xác toàn cục
+from decimal import Decimal
+from fractions import Fraction
+
+import engine_stats
+
+_EXACT_TYPES = frozenset((int, Fraction))
+_INT_TYPES = frozenset((int,))
+
+def _exact_quotient(num, den) -> int | float:
+        # Phép chia cuối cùng của chế độ chính xác: số nguyên nếu chia hết, không thì float(Fraction)
+        if type(num) is int and type(den) is int:
+                q, r = divmod(num, den)
+                return q if r == 0 else num / den
+        x = Fraction(num) / den
+        return x.numerator if x.denominator == 1 else float(x)
+
+def _exact_values(values) -> tuple:
+        # Decimal / float -> Fraction đúng giá trị đã nhập (0.1 -> 1/10), int / Fraction giữ nguyên
+        return tuple(Fraction(str(v)) if isinstance(v, (Decimal, float)) else v for v in values)
+
+@engine_stats.timed()
 def solve_equation_two(a1: int | float, b1: int | float, c1: int | float, 
                        a2: int | float, b2: int | float, c2: int | float, 
-                       lang: int = 1) -> tuple[int | float, int | float] | str:
-        if (a1 * b2 == a2 * b1 and b1 * c2 != b2 * c1):
-                return "No solution!!!" if lang == 1 else "Vô nghiệm"
-        elif (a1 * b2 == a2 * b1 and b1 * c2 == b2 * c1):
+                       lang: int = 1, exact: bool | None = None) -> tuple[int | float, int | float] | str:
+        # exact=None: tự chọn, hệ số toàn int / Fraction / Decimal thì tính đúng (Cramer, chỉ chia một lần ở cuối)
+        D = a1 * b2 - a2 * b1
+        Dx = c1 * b2 - c2 * b1
+        Dy = a1 * c2 - a2 * c1
+        # Định thức tính từ toàn int / Fraction thì vẫn là int / Fraction
+        kinds = {type(D), type(Dx), type(Dy)}
+        exact_kinds = kinds <= _EXACT_TYPES
+        if exact is None:
+                exact = exact_kinds or Decimal in kinds
+        if exact and not exact_kinds:
+                return solve_equation_two(*_exact_values((a1, b1, c1, a2, b2, c2)), lang=lang, exact=True)
+        engine_stats.record_path("solving_equations.solve_equation_two", "exact" if exact else "float")
+        if D == 0:
+                # Hạng [A|b] > hạng A thì vô nghiệm: còn định thức con 2x2 khác 0 (Dx hoặc Dy),
+                # hoặc A toàn 0 mà vế phải khác 0 (0x + 0y = 1)
+                if Dx != 0 or Dy != 0 or (a1 == b1 == a2 == b2 == 0 and (c1 != 0 or c2 != 0)):
+                        return "No solution!!!" if lang == 1 else "Vô nghiệm"
                 return "Every Real Solution" if lang == 1 else "Vô số nghiệm"
+        if exact:
+                if kinds == _INT_TYPES:
+                        # Trường hợp thường gặp (toàn int): chia thẳng, không tạo Fraction
+                        return (Dx // D if Dx % D == 0 else Dx / D, Dy // D if Dy % D == 0 else Dy / D)
+                return (_exact_quotient(Dx, D), _exact_quotient(Dy, D))
         y = ((a2 * c1) - (a1 * c2)) / ((a2 * b1) - (a1 * b2))
         if a1 != 0:
                 x = (c1 - b1 * y) / a1
@@ -16,20 +54,37 @@ def solve_equation_two(a1: int | float, b1: int | float, c1: int | float,
         y = int(y) if y.is_integer() else y
         return (x, y)
 
+@engine_stats.timed()
 def solve_equation_three(a1: int | float, b1: int | float, c1: int | float, k1: int | float,
                          a2: int | float, b2: int | float, c2: int | float, k2: int | float,
                          a3: int | float, b3: int | float, c3: int | float, k3: int | float, 
-                         lang: int = 1) -> tuple[int | float, int | float, int | float] | str:
+                         lang: int = 1, exact: bool | None = None) -> tuple[int | float, int | float, int | float] | str:
         D  = a1 * (b2 * c3 - b3 * c2) - b1 * (a2 * c3 - a3 * c2) + c1 * (a2 * b3 - a3 * b2)
         Dx = k1 * (b2 * c3 - b3 * c2) - b1 * (k2 * c3 - k3 * c2) + c1 * (k2 * b3 - k3 * b2)
         Dy = a1 * (k2 * c3 - k3 * c2) - k1 * (a2 * c3 - a3 * c2) + c1 * (a2 * k3 - a3 * k2)
         Dz = a1 * (b2 * k3 - b3 * k2) - b1 * (a2 * k3 - a3 * k2) + k1 * (a2 * b3 - a3 * b2)
+        kinds = {type(D), type(Dx), type(Dy), type(Dz)}
+        exact_kinds = kinds <= _EXACT_TYPES
+        if exact is None:
+                exact = exact_kinds or Decimal in kinds
+        if exact and not exact_kinds:
+                values = _exact_values((a1, b1, c1, k1, a2, b2, c2, k2, a3, b3, c3, k3))
+                return solve_equation_three(*values, lang=lang, exact=True)
+        engine_stats.record_path("solving_equations.solve_equation_three", "exact" if exact else "float")
 
         if D == 0:
-                if Dx == Dy == Dz == 0:
-                        return "Every Real Solution" if lang == 1 else "Vô số nghiệm"
-                else:
+                # Dx = Dy = Dz = 0 chưa đủ để kết luận vô số nghiệm (vd ba mặt phẳng song song),
+                # nên phân loại theo hạng như solve_equation_n
+                aug = [[a1, b1, c1, k1], [a2, b2, c2, k2], [a3, b3, c3, k3]]
+                if matrix_rank(aug, exact) > matrix_rank([row[:3] for row in aug], exact):
                         return "No solution!!!" if lang == 1 else "Vô nghiệm"
+                return "Every Real Solution" if lang == 1 else "Vô số nghiệm"
+        if exact:
+                if kinds == _INT_TYPES:
+                        # Trường hợp thường gặp (toàn int): chia thẳng, không tạo Fraction
+                        return (Dx // D if Dx % D == 0 else Dx / D, Dy // D if Dy % D == 0 else Dy / D,
+                                Dz // D if Dz % D == 0 else Dz / D)
+                return (_exact_quotient(Dx, D), _exact_quotient(Dy, D), _exact_quotient(Dz, D))
         x = Dx / D
         y = Dy / D
         z = Dz / D
@@ -37,6 +92,324 @@ def solve_equation_three(a1: int | float, b1: int | float, c1: int | float, k1:
         y = int(y) if y.is_integer() else y
         z = int(z) if z.is_integer() else z
         return (x, y, z)
+
+def _integer_row(values) -> list:
+        # Nhân cả phương trình với mẫu số chung để mọi hệ số là số nguyên (0.5 -> Fraction("0.5") = 1/2)
+        from math import lcm
+        fracs = [Fraction(str(v)) if isinstance(v, float) else Fraction(v) for v in values]
+        den = lcm(*(f.denominator for f in fracs))
+        return [int(f * den) for f in fracs]
+
+def _echelon_columns(A: list) -> tuple[list, list, list]:
+        # Biến đổi cột (ma trận unimodular U) để A*U có dạng bậc thang dưới (Hermite), bằng Euclid mở rộng
+        m, n = len(A), len(A[0])
+        B = [row[:] for row in A]
+        U = [[int(i == j) for j in range(n)] for i in range(n)]
+        pivots = []
+        r = 0
+        for i in range(m):
+                for j in range(r + 1, n):
+                        while B[i][j] != 0:
+                                q = B[i][r] // B[i][j]
+                                for M in (B, U):
+                                        for row in M:
+                                                row[r] -= q * row[j]
+                                                row[r], row[j] = row[j], row[r]
+                if r < n and B[i][r] != 0:
+                        pivots.append((i, r))
+                        r += 1
+                else:
+                        pivots.append((i, None))
+        return B, U, pivots
+
+def _echelon_rows(vectors: list) -> list:
+        # Đưa cơ sở lưới về dạng bậc thang (mỗi vector có cột dẫn riêng, tăng dần)
+        rows = [v[:] for v in vectors]
+        basis = []
+        for col in range(len(rows[0]) if rows else 0):
+                while True:
+                        live = [v for v in rows if v[col] != 0]
+                        if len(live) <= 1:
+                                break
+                        live.sort(key=lambda v: abs(v[col]))
+                        head = live[0]
+                        for v in live[1:]:
+                                q = v[col] // head[col]
+                                for k in range(len(v)):
+                                        v[k] -= q * head[k]
+                live = [v for v in rows if v[col] != 0]
+                if live:
+                        head = live[0]
+                        if head[col] < 0:
+                                head[:] = [-c for c in head]
+                        basis.append((col, head))
+                        rows = [v for v in rows if v is not head]
+        return basis
+
+def _parameter_range(point: list, vec: list, columns, low: int, high: int) -> range:
+        # Các t nguyên để low <= point[c] + t*vec[c] <= high với mọi c trong columns
+        t_low, t_high = None, None
+        for c in columns:
+                value, step = point[c], vec[c]
+                if step == 0:
+                        continue
+                if step < 0:
+                        value, step = -value, -step
+                        lo, hi = -high, -low
+                else:
+                        lo, hi = low, high
+                a, b = -((value - lo) // step), (hi - value) // step
+                t_low = a if t_low is None else max(t_low, a)
+                t_high = b if t_high is None else min(t_high, b)
+        return range(t_low, t_high + 1)
+
+def _projected_range(point: list, vec: list, other: list, low: int, high: int) -> range:
+        # Các t nguyên để có s thực với low <= point[c] + t*vec[c] + s*other[c] <= high với mọi c
+        # (khử s kiểu Fourier-Motzkin): lưới 2 chiều chỉ duyệt các t có điểm trong hộp
+        rows = []
+        for p, a, b in zip(point, vec, other):
+                rows.append((a, b, high - p))
+                rows.append((-a, -b, p - low))
+        bounds = [(a, r) for a, b, r in rows if b == 0]
+        for a1, b1, r1 in rows:
+                if b1 > 0:
+                        bounds.extend((-b2 * a1 + b1 * a2, -b2 * r1 + b1 * r2) for a2, b2, r2 in rows if b2 < 0)
+        t_low, t_high = None, None
+        for a, r in bounds:
+                if a > 0:
+                        t_high = r // a if t_high is None else min(t_high, r // a)
+                elif a < 0:
+                        t_low = -(r // -a) if t_low is None else max(t_low, -(r // -a))
+                elif r < 0:
+                        return range(0)
+        return range(t_low, t_high + 1)
+
+def solve_missing_equation(a1: int | float, b1: int | float, c1: int | float, k1: int | float,
+                           a2: int | float, b2: int | float, c2: int | float, k2: int | float,
+                           low: int, high: int, natural: bool = True):
+        """
+        Nghiệm nguyên (x, y, z) của hệ 2 phương trình 3 ẩn với x, y, z trong [low, high].
+        natural=True: chỉ lấy nghiệm tự nhiên (>= 0).
+        Giải đúng trên số nguyên (dạng Hermite + Euclid mở rộng): nghiệm = v0 + lưới,
+        rồi chỉ duyệt các điểm của lưới nằm trong hộp, không thử từng z.
+        Là generator, trả về nghiệm theo thứ tự từ điển.
+        """
+        A, k = [], []
+        for row in (_integer_row((a1, b1, c1, k1)), _integer_row((a2, b2, c2, k2))):
+                A.append(row[:3])
+                k.append(row[3])
+        if natural:
+                low = max(low, 0)
+        if low > high:
+                return
+
+        B, U, pivots = _echelon_columns(A)
+        w = [0, 0, 0]
+        rank = 0
+        for i, col in pivots:
+                rest = k[i] - sum(B[i][j] * w[j] for j in range(rank))
+                if col is None:
+                        if rest != 0:
+                                return
+                        continue
+                if rest % B[i][col] != 0:
+                        return
+                w[col] = rest // B[i][col]
+                rank += 1
+        v0 = [sum(U[r][c] * w[c] for c in range(3)) for r in range(3)]
+        kernel = [[U[r][c] for r in range(3)] for c in range(rank, 3)]
+        basis = _echelon_rows(kernel)
+
+        def walk(point, level, fixed_until):
+                # Tọa độ trước cột dẫn tiếp theo đã cố định: kiểm tra trong hộp
+                stop = basis[level][0] if level < len(basis) else 3
+                for c in range(fixed_until, stop):
+                        if not low <= point[c] <= high:
+                                return
+                if level == len(basis):
+                        yield tuple(point)
+                        return
+                col, vec = basis[level]
+                # Các tọa độ chỉ phụ thuộc tham số này (tới cột dẫn kế tiếp) chặn luôn khoảng của t
+                if level + 2 == len(basis):
+                        # Còn đúng một tham số nữa: chiếu cả lưới 2 chiều lên t
+                        ts = _projected_range(point, vec, basis[level + 1][1], low, high)
+                else:
+                        until = basis[level + 1][0] if level + 1 < len(basis) else 3
+                        ts = _parameter_range(point, vec, range(col, until), low, high)
+                for t in ts:
+                        yield from walk([p + t * d for p, d in zip(point, vec)], level + 1, col)
+
+        yield from walk(v0, 0, 0)
+
+def _is_exact(values) -> bool:
+        return set(map(type, values)) <= _EXACT_TYPES | {Decimal}
+
+def _bareiss(M: list, columns: int) -> list:
+        # Khử Gauss-Jordan không phân số (Bareiss) trên ma trận số nguyên M (sửa trực tiếp),
+        # chỉ chọn pivot trong `columns` cột đầu. Mọi phép chia đều chia hết; sau khi khử,
+        # mỗi phần tử là một định thức con nên số không phình to như khử bằng phân số.
+        # Trả về danh sách (hàng, cột) của các pivot.
+        pivots = []
+        prev = 1
+        r = 0
+        for c in range(columns):
+                p = next((i for i in range(r, len(M)) if M[i][c] != 0), None)
+                if p is None:
+                        continue
+                M[r], M[p] = M[p], M[r]
+                pivot = M[r][c]
+                for i in range(len(M)):
+                        if i != r:
+                                factor = M[i][c]
+                                M[i] = [(pivot * x - factor * y) // prev for x, y in zip(M[i], M[r])]
+                pivots.append((r, c))
+                prev = pivot
+                r += 1
+        return pivots
+
+def _lu_eliminate(M, columns: int) -> list:
+        # Khử LU với chọn pivot từng phần (numpy, sửa trực tiếp M), chỉ chọn pivot trong `columns` cột đầu.
+        # Trả về danh sách (hàng, cột) của các pivot.
+        import numpy as np
+        tol = max(M.shape) * np.finfo(float).eps * (np.abs(M[:, :columns]).max() if M.size else 0)
+        pivots = []
+        r = 0
+        for c in range(columns):
+                if r == M.shape[0]:
+                        break
+                p = r + int(np.argmax(np.abs(M[r:, c])))
+                if abs(M[p, c]) <= tol:
+                        M[r:, c] = 0
+                        continue
+                if p != r:
+                        M[[r, p]] = M[[p, r]]
+                M[r + 1:, c:] -= np.outer(M[r + 1:, c] / M[r, c], M[r, c:])
+                pivots.append((r, c))
+                r += 1
+        return pivots
+
+def _integer_matrix(A: list) -> list:
+        return [_integer_row(row) for row in A]
+
+def matrix_rank(A, exact: bool | None = None) -> int:
+        """Hạng của ma trận A (list các hàng). exact=None: tự chọn, số nguyên / Fraction thì tính đúng."""
+        A = [list(row) for row in A]
+        if not A:
+                return 0
+        if exact is None:
+                exact = _is_exact(v for row in A for v in row)
+        if exact:
+                return len(_bareiss(_integer_matrix(A), len(A[0])))
+        import numpy as np
+        return len(_lu_eliminate(np.array(A, dtype=float), len(A[0])))
+
+def _pretty(v: float) -> int | float:
+        v = float(v)
+        r = round(v)
+        return int(r) if abs(v - r) <= 1e-10 * max(1.0, abs(v)) else v
+
+@engine_stats.timed()
+def solve_equation_n(A, b, lang: int = 1, exact: bool | None = None) -> tuple | str:
+        """
+        Giải hệ n phương trình n ẩn A x = b (A: n hàng, mỗi hàng n hệ số; b: n hằng số).
+        exact=None: tự chọn; hệ số số nguyên / Fraction -> khử Bareiss chính xác, còn lại -> LU (numpy).
+        Phân loại theo hạng như solve_equation_two / three:
+        hạng A < hạng [A|b] -> vô nghiệm, hạng A < n -> vô số nghiệm.
+        """
+        A = [list(row) for row in A]
+        b = list(b)
+        n = len(A)
+        if n == 0 or len(b) != n or any(len(row) != n for row in A):
+                raise ValueError("A phải là ma trận vuông n x n và b có n phần tử")
+        if exact is None:
+                exact = _is_exact(v for row in A for v in row) and _is_exact(b)
+        engine_stats.record_path("solving_equations.solve_equation_n", "bareiss" if exact else "lu")
+
+        if exact:
+                M = _integer_matrix([row + [k] for row, k in zip(A, b)])
+                pivots = _bareiss(M, n)
+                consistent = all(M[i][n] == 0 for i in range(len(pivots), n))
+        else:
+                import numpy as np
+                M = np.array([row + [k] for row, k in zip(A, b)], dtype=float)
+                pivots = _lu_eliminate(M, n)
+                tol = n * np.finfo(float).eps * max(np.abs(M).max(), 1.0)
+                consistent = bool(np.all(np.abs(M[len(pivots):, n]) <= tol))
+
+        if not consistent:
+                return "No solution!!!" if lang == 1 else "Vô nghiệm"
+        if len(pivots) < n:
+                return "Every Real Solution" if lang == 1 else "Vô số nghiệm"
+
+        if exact:
+                # Sau Gauss-Jordan Bareiss, đường chéo đều bằng det(A): chỉ còn một phép chia cuối
+                det = M[0][0]
+                result = []
+                for i in range(n):
+                        x = Fraction(M[i][n], det)
+                        result.append(x.numerator if x.denominator == 1 else float(x))
+                return tuple(result)
+        x = np.zeros(n)
+        for i in range(n - 1, -1, -1):
+                x[i] = (M[i, n] - M[i, i + 1:n] @ x[i + 1:]) / M[i, i]
+        return tuple(_pretty(v) for v in x)
+
+# Batch: mã trạng thái, chỉ đổi sang chuỗi (Anh / Việt) khi hiển thị
+UNIQUE = 0              # nghiệm duy nhất
+NO_SOLUTION = 1         # vô nghiệm
+INFINITE = 2            # vô số nghiệm
+
+def status_message(status: int, lang: int = 1) -> str | None:
+        """Chuỗi hiển thị cho mã trạng thái; UNIQUE không có chuỗi (trả về None)."""
+        if status == NO_SOLUTION:
+                return "No solution!!!" if lang == 1 else "Vô nghiệm"
+        if status == INFINITE:
+                return "Every Real Solution" if lang == 1 else "Vô số nghiệm"
+        return None
+
+def _solve_batch(coeffs, n: int):
+        import numpy as np
+        coeffs = np.asarray(coeffs, dtype=float).reshape(-1, n * (n + 1))
+        aug = coeffs.reshape(-1, n, n + 1)
+        A, b = aug[:, :, :n], aug[:, :, n]
+        count = len(coeffs)
+        solutions = np.full((count, n), np.nan)
+        status = np.full(count, UNIQUE, dtype=np.int8)
+        if count == 0:
+                return solutions, status
+
+        # Định thức tính vectơ hóa cho cả mảng; |D| nhỏ so với cận Hadamard (tích độ dài các hàng) coi như D = 0
+        D = np.linalg.det(A)
+        scale = np.prod(np.linalg.norm(A, axis=2), axis=1)
+        unique = np.abs(D) > 16 * n * np.finfo(float).eps * scale
+        if unique.any():
+                solutions[unique] = np.linalg.solve(A[unique], b[unique][..., None])[..., 0]
+        # D = 0: phân loại theo hạng như solve_equation_n (hạng A < hạng [A|b] -> vô nghiệm)
+        singular = ~unique
+        if singular.any():
+                rank_a = np.linalg.matrix_rank(A[singular])
+                rank_aug = np.linalg.matrix_rank(aug[singular])
+                status[singular] = np.where(rank_aug > rank_a, NO_SOLUTION, INFINITE)
+        return solutions, status
+
+@engine_stats.timed()
+def solve_equation_two_batch(coeffs):
+        """
+        Giải nhiều hệ 2 ẩn cùng lúc. coeffs: mảng (N, 6), mỗi hàng a1 b1 c1 a2 b2 c2.
+        Trả về (solutions, status): solutions (N, 2) (nan nếu không có nghiệm duy nhất),
+        status (N,) gồm UNIQUE / NO_SOLUTION / INFINITE.
+        """
+        return _solve_batch(coeffs, 2)
+
+@engine_stats.timed()
+def solve_equation_three_batch(coeffs):
+        """
+        Giải nhiều hệ 3 ẩn cùng lúc. coeffs: mảng (N, 12), mỗi hàng a1 b1 c1 k1 a2 b2 c2 k2 a3 b3 c3 k3.
+        Trả về (solutions, status) như solve_equation_two_batch, solutions có dạng (N, 3).
+        """
+        return _solve_batch(coeffs, 3)
+
 # list_of_exception = ["No solution!!!", "Vô nghiệm", "Every Real Solution", "Vô số nghiệm"]
           
 #--------------input-output--------------#
@@ -85,24 +458,12 @@ if __name__ == "__main__":
                                 first = int(input("Left: "))
                                 end = int(input("Right: "))
                                 check = input("Z or N\nDefault: N\n").strip().upper()
+                                if check not in ("Z", "N", ""):
+                                        print(INVALID_INPUT)
+                                        exit(0)
                                 print("Prediction: ")
-                                for z in range(first, end + 1):
-                                        res = solve_equation_two(inp[0], inp[1], inp[3] - inp[2]*z,
-                                                                inp[4], inp[5], inp[7] - inp[6]*z, lang=lang)
-                                        if type(res) == str:
-                                                # print(res)
-                                                continue
-                                        x, y = res
-                                        if first <= x <= end and first <= y <= end:
-                                                if check == "Z":
-                                                        if x.is_integer() and y.is_integer():
-                                                                print((int(x), int(y), z))
-                                                elif check == "N" or check == "":
-                                                        if x.is_integer() and y.is_integer() and x >= 0 and y >= 0:
-                                                                print((int(x), int(y), z))
-                                                else: 
-                                                        print(INVALID_INPUT)
-                                                        exit(0)
+                                for res in solve_missing_equation(*inp, first, end, natural=(check != "Z")):
+                                        print(res)
                         else:
                                 print(INVALID_INPUT)
         elif lang == 2:
@@ -140,23 +501,12 @@ if __name__ == "__main__":
                                 first = int(input("Cực tiểu: "))
                                 end = int(input("Cực đại: "))
                                 check = input("Tiêu chí:\nSố nguyên (Z)\nSố tự nhiên (N)\n Mặc định: N").strip().upper()
+                                if check not in ("Z", "N", ""):
+                                        print(INVALID_INPUT)
+                                        exit(0)
                                 print("Dự đoán: ")
-                                for z in range(first, end + 1):
-                                        res = solve_equation_two(inp[0], inp[1], inp[3] - inp[2]*z,
-                                                                inp[4], inp[5], inp[7] - inp[6]*z, lang=lang)
-                                        if type(res) == str:
-                                                #print(res)
-                                                continue
-                                        x, y = res
-                                        if check == "Z":
-                                                if x == int(x) and y == int(y):
-                                                        print((int(x), int(y), z))
-                                        elif check == "N" or "":
-                                                if x == int(x) and y == int(y) and x >= 0 and y >= 0:
-                                                        print((int(x), int(y), z))
-                                        else: 
-                                                print(INVALID_INPUT)
-                                                exit(0)
+                                for res in solve_missing_equation(*inp, first, end, natural=(check != "Z")):
+                                        print(res)
                         else:
                                 print(INVALID_INPUT)
         else:
@@ -0,0 +1,173 @@
+# Chạy các phép sympy nặng (simplify, integrate, summation, product, solve) trong
+# một nhóm tiến trình con đã import sẵn sympy, có hạn chót (deadline) cho từng lời gọi.
+# Quá hạn thì giết tiến trình đó, thay bằng tiến trình mới và trả về TIME_OUT,
+# nên một biểu thức "bệnh" không làm treo người gọi.
+#
+#   from symbolic_executor import SymbolicExecutor
+#   with SymbolicExecutor(workers=2) as ex:
+#       ex.run("solve_eq", "x**2-4=0", exact=True, deadline=2.0)
+#       await ex.run_async("integral", 0, 1, "exp(-x**2)", exact=True)
+#
+# Hoặc bật cho cả session: CalculatorSession(deadline=2.0) -> các nhánh sympy của
+# evaluate_expression / integral / sigma / cm / solve_eq(exact=True) tự đi qua default_executor().
+import asyncio
+import atexit
+import functools
+import multiprocessing
+import queue
+import threading
+import time
+
+from process_front_end import MATH_ERROR, TIME_OUT, current_session, stor
+
+STARTUP_TIMEOUT = 60.0      # giây chờ một tiến trình mới import xong sympy (không tính vào deadline)
+DEFAULT_DEADLINE = 5.0
+
+def _worker_main(conn):
+    # Tiến trình con: import + làm nóng sympy một lần, rồi nhận việc qua Pipe
+    import process_front_end as engine
+    with engine.using(engine.CalculatorSession()):
+        engine.warmup()
+    conn.send(("ready",))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        name, args, kwargs, angle_mode, precision, variables = job
+        try:
+            session = engine.CalculatorSession(angle_mode, precision)
+            session.variables.set(**variables)
+            with engine.using(session):
+                result = getattr(engine, name)(*args, **kwargs)
+            conn.send(("ok", result, session.variables.as_dict()))
+        except Exception as exc:
+            conn.send(("error", repr(exc), None))
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), daemon=True,
+                                       name="symbolic-worker")
+        self.process.start()
+        child.close()
+        self.ready = False
+
+    def wait_ready(self, timeout: float) -> bool:
+        if not self.ready and self.conn.poll(timeout):
+            self.ready = self.conn.recv() == ("ready",)
+        return self.ready
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(1.0)
+        self.conn.close()
+
+class SymbolicExecutor:
+    """
+    Nhóm tiến trình con chạy hàm của process_front_end có hạn chót.
+    run() / run_async() trả về kết quả của hàm, MATH_ERROR nếu hàm lỗi / tiến trình chết,
+    TIME_OUT nếu quá deadline (tiến trình đó bị giết và thay mới).
+    Angle mode, số chữ số và biến của session hiện hành được gửi theo;
+    biến mà hàm đã STO (vd solve_eq -> x) được ghi lại vào session hiện hành.
+    """
+    def __init__(self, workers: int = 2, deadline: float = DEFAULT_DEADLINE, start_method: str = "spawn"):
+        self.deadline = deadline
+        self._context = multiprocessing.get_context(start_method)
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(workers):
+            self._spawn()
+
+    def _spawn(self):
+        worker = _Worker(self._context)
+        with self._lock:
+            self._workers.add(worker)
+        self._idle.put(worker)
+
+    def _retire(self, worker: _Worker):
+        with self._lock:
+            self._workers.discard(worker)
+        worker.kill()
+        if not self._closed:
+            self._spawn()
+
+    def run(self, name: str, *args, deadline: float | None = None, **kwargs):
+        if self._closed:
+            raise RuntimeError("executor is shut down")
+        deadline = self.deadline if deadline is None else deadline
+        session = current_session()
+        variables = session.variables.as_dict()
+        job = (name, args, kwargs, session.angle_mode, session.precision, variables)
+
+        start = time.monotonic()
+        try:
+            worker = self._idle.get(timeout=deadline)
+        except queue.Empty:
+            return TIME_OUT
+        remaining = deadline - (time.monotonic() - start)
+        try:
+            if not worker.wait_ready(STARTUP_TIMEOUT):
+                self._retire(worker)
+                return MATH_ERROR
+            end = time.monotonic() + remaining
+            worker.conn.send(job)
+            if not worker.conn.poll(max(0.0, end - time.monotonic())):
+                self._retire(worker)
+                return TIME_OUT
+            status, result, new_variables = worker.conn.recv()
+        except (EOFError, OSError, BrokenPipeError):
+            self._retire(worker)
+            return MATH_ERROR
+        self._idle.put(worker)
+
+        if status != "ok":
+            return MATH_ERROR
+        changed = {k: v for k, v in new_variables.items() if variables.get(k) != v}
+        if changed:
+            stor(**changed)
+        return result
+
+    async def run_async(self, name: str, *args, deadline: float | None = None, **kwargs):
+        """Như run() nhưng không chặn event loop (chờ ở thread pool mặc định của asyncio)."""
+        import contextvars
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self.run, name, *args, deadline=deadline, **kwargs)
+        # copy_context để luồng chờ thấy đúng session hiện hành của coroutine
+        return await loop.run_in_executor(None, contextvars.copy_context().run, call)
+
+    def shutdown(self):
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+            worker.process.join(0.5)
+            if worker.process.is_alive():
+                worker.kill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+_DEFAULT = None
+_DEFAULT_LOCK = threading.Lock()
+
+def default_executor() -> SymbolicExecutor:
+    """Executor dùng chung (tạo khi cần lần đầu, tắt khi thoát chương trình)."""
+    global _DEFAULT
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            _DEFAULT = SymbolicExecutor()
+            atexit.register(_DEFAULT.shutdown)
+        return _DEFAULT